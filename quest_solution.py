@@ -1,9 +1,19 @@
 import os
-import json
+import re
+import html
+import gzip
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
 from urllib.parse import urljoin
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+import orjson
+import numpy as np
 import pandas as pd
 
 # User Inputs
@@ -14,37 +24,69 @@ AWS_REGION = "ap-south-1"
 # DATASETS
 DATA_DIR = "data"
 DATASET1_URL = "https://download.bls.gov/pub/time.series/pr"
+# directory listing links, BLS serves them uppercase as <A HREF="/pub/...">
+DATASET1_HREF_RE = re.compile(rb'href="([^"]+)"', re.IGNORECASE)
 DATASET1_HEADERS = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:141.0) Gecko/20100101 Firefox/141.0"}
 
 DATASET2_URL = "https://honolulu-api.datausa.io/tesseract/data.jsonrecords?cube=acs_yg_total_population_1&drilldowns=Year%2CNation&locale=en&measures=Population"
 DATASET2_JSON_FILE = "usa_population.json"
 
+# Parallel transfers
+MAX_WORKERS = 16
+S3_DELETE_BATCH_SIZE = 1000  # max keys S3 accepts per delete_objects request
+S3_DELETE_WORKERS = 8
+COPY_BUFFER_SIZE = 1024 * 1024
+# BLS files are small, keep them below the multipart threshold so they go up in a single PUT
+S3_TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024, max_concurrency=8, use_threads=True)
+
+# Shared clients, built once and reused by every helper
+# sized above the thread count so parallel transfers keep reusing pooled connections
+POOL_CONNECTIONS = 32
+S3_CLIENT = boto3.client('s3',region_name=AWS_REGION,
+                         config=Config(max_pool_connections=POOL_CONNECTIONS))
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.headers.update(DATASET1_HEADERS)
+HTTP_SESSION.mount("https://", HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_CONNECTIONS,
+                                           max_retries=3))
+
 # Helper functions
+class TeeReader:
+    """
+    File-like wrapper that copies every chunk read from a stream into a second file.
+    """
+    def __init__(self, stream, sink):
+        self.stream = stream
+        self.sink = sink
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.sink.write(data)
+        return data
+
 def create_s3_bucket(bucket_name):
     """
     Function to create an S3 bucket if it does not already exist.
     """
-    s3 = boto3.client('s3',region_name=AWS_REGION)
-    bucket_exists = any([ bucket["Name"] for bucket in boto3.client('s3').list_buckets()["Buckets"] 
-                 if bucket["Name"] == bucket_name])
-    if bucket_exists:
+    try:
+        S3_CLIENT.head_bucket(Bucket=bucket_name)
         print(f"Bucket {bucket_name} already exists")
-    else:
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchBucket"):
+            raise
         print(f"Creating bucket {bucket_name}")
-        s3.create_bucket(Bucket=bucket_name,CreateBucketConfiguration={'LocationConstraint': AWS_REGION})
+        S3_CLIENT.create_bucket(Bucket=bucket_name,CreateBucketConfiguration={'LocationConstraint': AWS_REGION})
 
 def get_dataset1_info():
     """
     Function to retrive file, URL mappings for first dataset.
     """
-    response = requests.get(DATASET1_URL,headers=DATASET1_HEADERS)
+    response = HTTP_SESSION.get(DATASET1_URL)
     response.raise_for_status()
     
-    soup = BeautifulSoup(response.text, 'html.parser')
     files_dict = {}
-    for a in soup.find_all('a'):
-        href = a.get('href')
-        if href and not href.endswith('/'):  # skip directories & parent links
+    for match in DATASET1_HREF_RE.findall(response.content):
+        href = html.unescape(match.decode())
+        if not href.endswith('/'):  # skip directories & parent links
             filename = href.split('/')[-1]
             files_dict[filename] = urljoin(DATASET1_URL, href)
     return files_dict
@@ -53,77 +95,125 @@ def get_dataset2_json():
     """
     Function to download the second dataset as JSON.
     """
-    response = requests.get(DATASET2_URL)
+    response = HTTP_SESSION.get(DATASET2_URL, stream=True)
     response.raise_for_status()
-    data = response.json()
     download_dir = os.path.join(DATA_DIR, "dataset2")
     os.makedirs(download_dir, exist_ok=True)
-    with open(os.path.join(download_dir, DATASET2_JSON_FILE), 'w') as f:
-        json.dump(data, f, indent=4)
+    # save the API body as served, it is parsed only once when loaded for analytics
+    with open(os.path.join(download_dir, DATASET2_JSON_FILE), 'wb') as f:
+        for chunk in response.iter_content(chunk_size=COPY_BUFFER_SIZE):
+            f.write(chunk)
     print(f"Dataset 2 JSON saved to {DATASET2_JSON_FILE}")
 
 def get_s3_objects(bucket_name,s3_prefix=""):
     """
-    Function to get list of objects(files) in an S3 bucket.
+    Function to get objects(files) in an S3 bucket, mapped to their (size, last modified).
     """
-    s3 = boto3.client('s3',region_name=AWS_REGION)
-    objects = []
+    objects = {}
+    prefix_len = len(s3_prefix)
 
-    paginator = s3.get_paginator('list_objects_v2')
-    for page in paginator.paginate(Bucket=bucket_name, Prefix=s3_prefix):
+    paginator = S3_CLIENT.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=s3_prefix,
+                                   PaginationConfig={'PageSize': 1000}):
         if 'Contents' in page:
             for item in page['Contents']:
                 key = item['Key']
                 if not key.endswith('/'):  # skip folder marker keys
                     if key.startswith(s3_prefix):
-                        key = key.split(s3_prefix)[1]
-                    objects.append(key)
+                        key = key[prefix_len:]
+                    objects[key] = (item['Size'], item['LastModified'])
 
     return objects
 
+def is_s3_copy_stale(file_url, s3_object):
+    """
+    Function to check with a HEAD request whether a Dataset 1 file changed since it was uploaded to S3.
+    """
+    s3_size, s3_last_modified = s3_object
+    # ask for the plain body so Content-Length is comparable with the stored object size,
+    # and follow redirects like the GET does
+    head_resp = HTTP_SESSION.head(file_url, headers={"Accept-Encoding": "identity"}, allow_redirects=True)
+    if not head_resp.ok:
+        # can't tell without a usable HEAD, let the GET fetch the file
+        return True
+    content_length = head_resp.headers.get("Content-Length")
+    if content_length is None or int(content_length) != s3_size:
+        return True
+    last_modified = head_resp.headers.get("Last-Modified")
+    return last_modified is not None and parsedate_to_datetime(last_modified) > s3_last_modified
+
 def upload_files_to_s3(files_info, existing_s3_files, s3_prefix=""):
     """
     Function to upload files to S3 bucket from Dataset 1.
     """
-    s3 = boto3.client('s3',region_name=AWS_REGION)
     files_to_download = [ "pr.data.0.Current" ]
 
     download_dir = os.path.join(DATA_DIR, "dataset1")
     os.makedirs(download_dir, exist_ok=True)
 
-    for filename, file_url in files_info.items():
-        #skip filenames with no urls to download, usually these are not part of Dataset1
-        if file_url is None: continue
-        file_resp = None
-        if filename not in existing_s3_files:
-            file_resp = requests.get(file_url, stream=True, headers=DATASET1_HEADERS)
-            file_resp.raise_for_status()
-            print(f"Uploading {filename} to S3...")
-            s3.upload_fileobj(file_resp.raw, S3_BUCKET_NAME, f"{s3_prefix}{filename}")
-        else:
-            print(f"Skipping {filename}, already in S3.")
-        
+    def _process_one(filename, file_url):
+        upload = filename not in existing_s3_files or is_s3_copy_stale(file_url, existing_s3_files[filename])
         filepath = os.path.join(download_dir, filename)
-        if filename in files_to_download and not os.path.exists(filepath):    
-            print(f"Downloading {filename} to local directory...")
-            if file_resp is None:
-                file_resp = requests.get(file_url, stream=True, headers=DATASET1_HEADERS)
-                file_resp.raise_for_status()
-            with open(filepath, "wb") as f:
-                for chunk in file_resp.iter_content(chunk_size=8192):
-                    f.write(chunk)
+        # a refreshed S3 copy means the local copy is outdated as well
+        download = filename in files_to_download and (upload or not os.path.exists(filepath))
+        if not upload:
+            print(f"Skipping {filename}, already in S3 and unchanged.")
+        if not (upload or download):
+            return
+
+        # single GET per file, the body is split between S3 and disk when both need it
+        file_resp = HTTP_SESSION.get(file_url, stream=True)
+        file_resp.raise_for_status()
+        file_resp.raw.decode_content = True
+        if not download:
+            print(f"Uploading {filename} to S3...")
+            S3_CLIENT.upload_fileobj(file_resp.raw, S3_BUCKET_NAME, f"{s3_prefix}{filename}",
+                                     Config=S3_TRANSFER_CONFIG)
+            return
+
+        print(f"Downloading {filename} to local directory...")
+        # write beside the last good copy and swap it in only once the transfer succeeded
+        part_path = filepath + ".part"
+        try:
+            with open(part_path, "wb") as f:
+                if upload:
+                    print(f"Uploading {filename} to S3...")
+                    S3_CLIENT.upload_fileobj(TeeReader(file_resp.raw, f), S3_BUCKET_NAME,
+                                             f"{s3_prefix}{filename}", Config=S3_TRANSFER_CONFIG)
+                else:
+                    shutil.copyfileobj(file_resp.raw, f, length=COPY_BUFFER_SIZE)
+        except Exception:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        os.replace(part_path, filepath)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        #skip filenames with no urls to download, usually these are not part of Dataset1
+        futures = [executor.submit(_process_one, filename, file_url)
+                   for filename, file_url in files_info.items() if file_url is not None]
+        for future in as_completed(futures):
+            future.result()
 
 def remove_files_from_s3(files_info, existing_s3_files,s3_prefix=""):
     """
     Function to delete files from S3 bucket that are not present in Dataset 1.
     """
-    files_to_delete = set(existing_s3_files) - set(files_info.keys())
-    s3 = boto3.client('s3',region_name=AWS_REGION)
+    files_to_delete = existing_s3_files.keys() - files_info.keys()
     if files_to_delete:
         print("Deleting obsolete files from S3...")
         delete_objects = [{"Key": f"{s3_prefix}{f}"} for f in files_to_delete]
-        s3.delete_objects(Bucket=S3_BUCKET_NAME, Delete={"Objects": delete_objects})
-        print(f"Deleted {len(delete_objects)} files.")
+        batches = [delete_objects[i:i + S3_DELETE_BATCH_SIZE]
+                   for i in range(0, len(delete_objects), S3_DELETE_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=S3_DELETE_WORKERS) as executor:
+            responses = list(executor.map(
+                lambda batch: S3_CLIENT.delete_objects(Bucket=S3_BUCKET_NAME,
+                                                       Delete={"Objects": batch, "Quiet": True}),
+                batches))
+        errors = [error for response in responses for error in response.get("Errors", [])]
+        for error in errors:
+            print(f"Failed to delete {error['Key']}: {error['Message']}")
+        print(f"Deleted {len(delete_objects) - len(errors)} files.")
     else:
         print("No files to delete.")
 
@@ -131,62 +221,75 @@ def generate_index_html(prefix):
     """
     Create an index.html to place in s3 and serve the bucket objects as static webpage
     """
-    s3 = boto3.client("s3", region_name=AWS_REGION)
-
-    response = s3.list_objects_v2(Bucket=S3_BUCKET_NAME, Prefix=prefix)
-    if "Contents" not in response:
+    def _list_items():
+        paginator = S3_CLIENT.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if key.endswith("/"):  # skip "folder markers"
+                    continue
+                filename = key.split("/")[-1]
+                file_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{key}"
+                yield f'<li><a href="{html.escape(file_url)}">{html.escape(filename)}</a></li>'
+
+    items = "\n".join(_list_items())
+    if not items:
         print("No files found in S3 folder.")
         return
 
-    html_lines = [
-        "<!DOCTYPE html>",
-        "<html><head><title>Dataset Files</title></head><body>",
-        f"<h2>Files in {prefix}</h2>",
-        "<ul>"
-    ]
-
-    for obj in response["Contents"]:
-        key = obj["Key"]
-        if key.endswith("/"):  # skip "folder markers"
-            continue
-        filename = key.split("/")[-1]
-        file_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{key}"
-        html_lines.append(f'<li><a href="{file_url}">{filename}</a></li>')
-
-    html_lines.append("</ul></body></html>")
-    html_content = "\n".join(html_lines)
+    html_content = (
+        "<!DOCTYPE html>\n"
+        "<html><head><title>Dataset Files</title></head><body>\n"
+        f"<h2>Files in {html.escape(prefix)}</h2>\n"
+        "<ul>\n"
+        f"{items}\n"
+        "</ul></body></html>"
+    )
 
     # upload index.html into the folder
     index_key = prefix + "index.html"
-    s3.put_object(
+    S3_CLIENT.put_object(
         Bucket=S3_BUCKET_NAME,
         Key=index_key,
-        Body=html_content,
-        ContentType="text/html"
+        Body=gzip.compress(html_content.encode()),
+        ContentType="text/html",
+        ContentEncoding="gzip"
     )
 
     print(f"index.html uploaded to s3://{S3_BUCKET_NAME}/{index_key}")
     print(f"Access it via: https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{index_key}")
 
-def sync_bucket(s3_prefix="dataset/"):
+def upload_dataset2_json(s3_prefix=""):
     """
-    Function to synchronize files with S3 bucket.
-    and uploads Dataset 2 JSON to S3.
+    Function to download the second dataset and upload the JSON to S3.
     """
-    remote_files = get_dataset1_info()
-    s3_files = get_s3_objects(S3_BUCKET_NAME,s3_prefix)
-    remote_files["index.html"] = None
-    remote_files[DATASET2_JSON_FILE] = None
-    upload_files_to_s3(remote_files,s3_files,s3_prefix)
-    remove_files_from_s3(remote_files,s3_files,s3_prefix)
-    
     print("Uploading Dataset 2 JSON to S3...")
     get_dataset2_json()
     dataset2_path = os.path.join(DATA_DIR, "dataset2", DATASET2_JSON_FILE)
-    s3 = boto3.client('s3',region_name=AWS_REGION)
-    s3.upload_file(dataset2_path, S3_BUCKET_NAME, f"{s3_prefix}{DATASET2_JSON_FILE}")
+    S3_CLIENT.upload_file(dataset2_path, S3_BUCKET_NAME, f"{s3_prefix}{DATASET2_JSON_FILE}")
     print(f"Uploaded {DATASET2_JSON_FILE} to S3 bucket {S3_BUCKET_NAME}")
 
+def sync_bucket(s3_prefix="dataset/"):
+    """
+    Function to synchronize files with S3 bucket.
+    and uploads Dataset 2 JSON to S3.
+    """
+    # the BLS listing, the S3 listing and Dataset 2 are independent, so fetch them concurrently
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        remote_files_future = executor.submit(get_dataset1_info)
+        s3_files_future = executor.submit(get_s3_objects, S3_BUCKET_NAME, s3_prefix)
+        dataset2_future = executor.submit(upload_dataset2_json, s3_prefix)
+
+        remote_files = remote_files_future.result()
+        s3_files = s3_files_future.result()
+        remote_files["index.html"] = None
+        remote_files[DATASET2_JSON_FILE] = None
+        # deletes only touch keys missing from the listing, so they can run alongside the uploads
+        remove_future = executor.submit(remove_files_from_s3, remote_files, s3_files, s3_prefix)
+        upload_files_to_s3(remote_files,s3_files,s3_prefix)
+        remove_future.result()
+        dataset2_future.result()
+
     print("S3 Sync complete.")
     generate_index_html(s3_prefix)
 
@@ -197,11 +300,18 @@ sync_bucket()
 
 # Data analytics
 
-df1 = pd.read_csv(os.path.join(DATA_DIR, "dataset1", "pr.data.0.Current"), sep="\t")
+# pyarrow parses the file multithreaded and keeps strings in Arrow buffers
+df1 = pd.read_csv(os.path.join(DATA_DIR, "dataset1", "pr.data.0.Current"), sep="\t",
+                  engine="pyarrow", dtype_backend="pyarrow")
 df1.columns = df1.columns.str.strip()
-df1 = df1.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
-ds2_json = json.load(open(os.path.join(DATA_DIR, "dataset2", DATASET2_JSON_FILE)))
+str_cols = [col for col in df1.columns if pd.api.types.is_string_dtype(df1[col])]
+df1[str_cols] = df1[str_cols].apply(lambda col: col.str.strip())
+# category codes make the series_id/period grouping and filters hash ints instead of strings
+df1 = df1.astype({"year": "int16", "value": "float64", "series_id": "category", "period": "category"})
+with open(os.path.join(DATA_DIR, "dataset2", DATASET2_JSON_FILE), "rb") as ds2_file:
+    ds2_json = orjson.loads(ds2_file.read())
 df2 = pd.json_normalize(ds2_json['data'])
+df2 = df2.astype({"Year": "int16", "Population": "float64", "Nation": "category"})
 
 html_lines = [
         "<!DOCTYPE html>",
@@ -209,16 +319,23 @@ html_lines = [
         f"<h2>Data Analytics</h2>"
     ]
 
-pop_df = df2[(df2['Year']>=2013) & (df2['Year']<=2018)]['Population']
+years = df2['Year'].to_numpy()
+population = df2['Population'].to_numpy()
+# drop missing values in the same mask, pandas' mean/std skip them too
+pop = population[(years >= 2013) & (years <= 2018) & ~np.isnan(population)]
+pop_mean, pop_std = pop.mean(), pop.std(ddof=1)  # ddof=1 matches the pandas sample std
 html_lines.append("<h3>Population Data statistics from 2013 to 2918</h3>")
-html_lines.append(f"<p>Mean: {pop_df.mean()}</p>")
-html_lines.append(f"<p>Standard Deviation: {pop_df.std()}</p>")
+html_lines.append(f"<p>Mean: {pop_mean}</p>")
+html_lines.append(f"<p>Standard Deviation: {pop_std}</p>")
 print("Population Data statistics from 2013 to 2918")
-print(f"Mean: {pop_df.mean()}")
-print(f"Standard Deviation: {pop_df.std()}")
-
-df1_by_sid_yr = df1.groupby(['series_id','year'], as_index=False)['value'].sum()
-df1_by_best_yr = df1_by_sid_yr.loc[df1_by_sid_yr.groupby("series_id")["value"].idxmax()].reset_index(drop=True)
+print(f"Mean: {pop_mean}")
+print(f"Standard Deviation: {pop_std}")
+
+# the source file is already ordered by series_id/year, so skip the groupby sorts,
+# observed=True keeps categorical series_id from expanding to every series/year combination
+df1_by_sid_yr = df1.groupby(['series_id','year'], sort=False, observed=True, as_index=False)['value'].sum()
+best_yr_idx = df1_by_sid_yr.groupby("series_id", sort=False, observed=True)["value"].idxmax()
+df1_by_best_yr = df1_by_sid_yr.loc[best_yr_idx].reset_index(drop=True)
 html_lines.append("<h3>Best year info per series_id</h3>")
 html_lines.append(df1_by_best_yr.to_html(index=False))
 
@@ -227,13 +344,10 @@ period = 'Q01'
 year = 2018
 
 
-filtered_df1 = df1[(df1['series_id'] == series_id) 
-                   & (df1['period'] == period)
-                   & (df1['year'] == year)]
-merged_df = pd.merge(filtered_df1,df2,
-         left_on=['year'],
-         right_on=['Year'],
-         how='inner')[['series_id','year','period','value','Population']]
+filtered_df1 = df1.query("series_id == @series_id and period == @period and year == @year")
+pop_by_year = dict(zip(df2['Year'].to_numpy(), df2['Population'].to_numpy()))
+merged_df = filtered_df1.assign(Population=filtered_df1['year'].map(pop_by_year))[
+    ['series_id','year','period','value','Population']]
 html_lines.append(f"<h3>Population details for series_id: {series_id}, period: {period}, year: {year} </h3>")
 html_lines.append(merged_df.to_html(index=False))
 